@@ -12,13 +12,39 @@
 
 import os
 import json
-import argparse
-import logging
 import shutil
+import subprocess
 from enum import Enum
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import dsa, rsa
 from OpenSSL import crypto
 from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Certs, keys and the store are written whole, so give each writer a buffer
+# large enough to flush the entire payload in a single write
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Number of parsed CA key-cert pairs Certipy keeps around for signing
+CA_CACHE_SIZE = 32
+
+# Extensions that don't depend on the cert being signed only need to be
+# parsed by OpenSSL once
+_EXT_CA_KEY_USAGE = crypto.X509Extension(
+    b"keyUsage", True, b"keyCertSign, cRLSign")
+_EXT_SERVER_CLIENT_AUTH = crypto.X509Extension(
+    b"extendedKeyUsage", True, b"serverAuth, clientAuth")
+
+# Order in which the documented subject fields are added to requests
+_NAME_ORDER = ("C", "ST", "L", "O", "OU", "CN", "emailAddress")
 
 
 class TLSFileType(Enum):
@@ -45,38 +71,124 @@ class CertificateAuthorityInUseError(Exception):
         self.errors = errors
 
 
+def _generate_key(cert_type, bits):
+    """Create a PKey with the key generation APIs in cryptography"""
+
+    if cert_type not in (crypto.TYPE_RSA, crypto.TYPE_DSA):
+        raise ValueError("Unsupported key type {}".format(cert_type))
+
+    try:
+        if cert_type == crypto.TYPE_RSA:
+            key = rsa.generate_private_key(
+                public_exponent=65537, key_size=bits,
+                backend=default_backend())
+        else:
+            key = dsa.generate_private_key(
+                key_size=bits, backend=default_backend())
+    except ValueError:
+        # cryptography only allows a fixed set of key sizes (1024-4096 bits
+        # for DSA), which OpenSSL itself doesn't require
+        pkey = crypto.PKey()
+        pkey.generate_key(cert_type, bits)
+        return pkey
+    return crypto.PKey.from_cryptography_key(key)
+
+
+def _generate_key_der(cert_type, bits):
+    """Create a key in a worker process, returned as DER for pickling"""
+
+    pkey = _generate_key(cert_type, bits)
+    return crypto.dump_privatekey(crypto.FILETYPE_ASN1, pkey)
+
+
+def _genrsa_openssl(openssl_path, bits):
+    """Create an RSA key with the openssl command line tool, as PEM"""
+
+    return subprocess.check_output(
+        [openssl_path, 'genrsa', str(bits)], stderr=subprocess.DEVNULL)
+
+
+@lru_cache(maxsize=8)
+def _ca_basic_constraints(pathlen):
+    """Create the basicConstraints extension for a CA"""
+
+    basicConstraints = "CA:true"
+    # If pathlen is exactly 0, this CA cannot sign intermediaries.
+    # A negative value leaves this out entirely and allows arbitrary
+    # numbers of intermediates.
+    if pathlen >= 0:
+        basicConstraints += ', pathlen:' + str(pathlen)
+    return crypto.X509Extension(
+        b"basicConstraints", True, basicConstraints.encode())
+
+
+def _prepare_dir(containing_dir):
+    """Ensure a directory for TLS files exists with 0o755 permissions"""
+
+    try:
+        os.chmod(containing_dir, mode=0o755)
+    except OSError:
+        os.makedirs(containing_dir, mode=0o755, exist_ok=True)
+        os.chmod(containing_dir, mode=0o755)
+
+
 @contextmanager
-def open_tls_file(file_path, mode, private=True):
+def open_tls_file(file_path, mode, private=True, prepared_dirs=None):
     """Context to ensure correct file permissions for certs and directories
 
     Ensures:
         - A containing directory with appropriate permissions
         - Correct file permissions based on what the file is (0o600 for keys
         and 0o644 for certs)
+
+    When writing, directories found in the prepared_dirs set are assumed to
+    be set up already; directories prepared here are added to it.
     """
 
     containing_dir = os.path.dirname(file_path)
-    fh = None
-    try:
-        if 'w' in mode:
-            os.chmod(containing_dir, mode=0o755)
-        fh = open(file_path, mode)
-    except OSError as e:
-        if 'w' in mode:
-            os.makedirs(containing_dir, mode=0o755, exist_ok=True)
-            os.chmod(containing_dir, mode=0o755)
-            fh = open(file_path, 'w')
-        else:
+    perms = 0o600 if private else 0o644
+    if 'w' in mode:
+        if prepared_dirs is None or containing_dir not in prepared_dirs:
+            _prepare_dir(containing_dir)
+            if prepared_dirs is not None:
+                prepared_dirs.add(containing_dir)
+        # Create the file with its final permissions so that keys are never
+        # readable by others, even briefly. The mode given to os.open is
+        # masked by the umask and ignored for existing files, so set it on the
+        # descriptor as well before anything is written.
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        try:
+            fd = os.open(file_path, flags, perms)
+        except FileNotFoundError:
+            # The directory was removed after it was prepared
+            _prepare_dir(containing_dir)
+            fd = os.open(file_path, flags, perms)
+        try:
+            # os.fchmod is only available on Windows from Python 3.13
+            if hasattr(os, 'fchmod'):
+                os.fchmod(fd, perms)
+            else:
+                os.chmod(file_path, mode=perms)
+            fh = os.fdopen(fd, mode, buffering=WRITE_BUFFER_SIZE)
+        except BaseException:
+            os.close(fd)
             raise
-    yield fh
-    mode = 0o600 if private else 0o644
-    os.chmod(file_path, mode=mode)
-    fh.close()
+    else:
+        fh = open(file_path, mode)
+    try:
+        yield fh
+    finally:
+        if 'w' not in mode:
+            os.chmod(file_path, mode=perms)
+        fh.close()
 
 
 class TLSFile():
     """Describes basic information about files used for TLS"""
 
+    __slots__ = ('file_path', 'containing_dir', 'encoding', 'file_type',
+                 'x509')
+
     def __init__(self, file_path, encoding=crypto.FILETYPE_PEM,
                  file_type=TLSFileType.CERT, x509=None):
         self.file_path = file_path
@@ -86,18 +198,16 @@ class TLSFile():
         self.x509 = x509
 
     def __str__(self):
-        data = ''
+        return bytes(self).decode("utf-8")
+
+    def __bytes__(self):
         if not self.x509:
             self.load()
 
         if self.file_type is TLSFileType.KEY:
-            data = crypto.dump_privatekey(
-                self.encoding, self.x509).decode("utf-8")
+            return crypto.dump_privatekey(self.encoding, self.x509)
         else:
-            data = crypto.dump_certificate(
-                self.encoding, self.x509).decode("utf-8")
-
-        return data
+            return crypto.dump_certificate(self.encoding, self.x509)
 
     def get_extension_value(self, ext_name):
         if self.is_private():
@@ -134,27 +244,29 @@ class TLSFile():
         """Load from a file and return an x509 object"""
 
         private = self.is_private()
-        with open_tls_file(self.file_path, 'r', private=private) as fh:
+        with open_tls_file(self.file_path, 'rb', private=private) as fh:
             if private:
                 self.x509 = crypto.load_privatekey(self.encoding, fh.read())
             else:
                 self.x509 = crypto.load_certificate(self.encoding, fh.read())
             return self.x509
 
-    def save(self, x509):
+    def save(self, x509, prepared_dirs=None):
         """Persist this x509 object to disk"""
 
         self.x509 = x509
-        with open_tls_file(self.file_path, 'w',
-                           private=self.is_private()) as fh:
-            fh.write(str(self))
+        with open_tls_file(self.file_path, 'wb', private=self.is_private(),
+                           prepared_dirs=prepared_dirs) as fh:
+            fh.write(bytes(self))
 
 
 class TLSFileBundle():
     """Maintains information that is shared by a set of TLSFiles"""
 
+    __slots__ = ('record',) + tuple(t.value for t in TLSFileType)
+
     def __init__(self, common_name, files=None, x509s=None, serial=0,
-                 is_ca=False, parent_ca='', signees=None):
+                 is_ca=False, parent_ca='', signees=None, prepared_dirs=None):
         self.record = {}
         self.record['serial'] = serial
         self.record['is_ca'] = is_ca
@@ -166,7 +278,7 @@ class TLSFileBundle():
         files = files or {}
         x509s = x509s or {}
         self._setup_tls_files(files)
-        self.save_x509s(x509s)
+        self.save_x509s(x509s, prepared_dirs=prepared_dirs)
 
     def _setup_tls_files(self, files):
         """Initiates TLSFIle objects with the paths given to this bundle"""
@@ -177,7 +289,7 @@ class TLSFileBundle():
                 setattr(self, file_type.value,
                         TLSFile(file_path, file_type=file_type))
 
-    def save_x509s(self, x509s):
+    def save_x509s(self, x509s, prepared_dirs=None):
         """Saves the x509 objects to the paths known by this bundle"""
 
         for file_type in TLSFileType:
@@ -187,7 +299,7 @@ class TLSFileBundle():
                     # persist this key or cert to disk
                     tlsfile = getattr(self, file_type.value)
                     if tlsfile:
-                        tlsfile.save(x509)
+                        tlsfile.save(x509, prepared_dirs=prepared_dirs)
 
     def load_all(self):
         """Utility to load bring all files into memory"""
@@ -238,6 +350,10 @@ class CertStore():
     def __init__(self, containing_dir='out', store_file='certipy.json',
                  remove_existing=False):
         self.store = {}
+        self._batch_depth = 0
+        self._dirty = False
+        # Directories this store has already written TLS files into
+        self._prepared_dirs = set()
         self.containing_dir = containing_dir
         self.store_file_path = os.path.join(containing_dir, store_file)
         try:
@@ -251,16 +367,50 @@ class CertStore():
             os.chmod(containing_dir, mode=0o755)
 
     def save(self):
-        """Write the store dict to a file specified by store_file_path"""
+        """Write the store dict to a file specified by store_file_path
+
+        The store is written to a temporary file which then replaces the
+        original, so a crash never leaves a partially written store behind.
+        Inside of a batch, this is deferred until the batch completes.
+        """
+
+        if self._batch_depth:
+            self._dirty = True
+            return
 
-        with open(self.store_file_path, 'w') as fh:
-            fh.write(json.dumps(self.store, indent=4))
+        tmp_file_path = self.store_file_path + '.tmp'
+        with open(tmp_file_path, 'wb' if orjson else 'w',
+                  buffering=WRITE_BUFFER_SIZE) as fh:
+            if orjson:
+                fh.write(orjson.dumps(self.store))
+            else:
+                json.dump(self.store, fh, separators=(',', ':'))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_file_path, self.store_file_path)
+        self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        """Context to write the store once after a set of changes
+
+        The store is only written if something in the batch saved it.
+        """
+
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._dirty:
+                self.save()
 
     def load(self):
         """Read the store dict from file"""
 
-        with open(self.store_file_path, 'r') as fh:
-            self.store = json.loads(fh.read())
+        with open(self.store_file_path, 'rb') as fh:
+            data = fh.read()
+        self.store = orjson.loads(data) if orjson else json.loads(data)
 
     def get_record(self, common_name):
         """Return the record associated with this common name
@@ -270,13 +420,12 @@ class CertStore():
         returns just that and doesn't bother loading the associated files.
         """
 
-        try:
-            record = self.store[common_name]
-            return record
-        except KeyError as e:
+        record = self.store.get(common_name)
+        if record is None:
             raise CertNotFoundError(
                 "Unable to find record of {name}"
-                .format(name=common_name), errors=e)
+                .format(name=common_name), errors=KeyError(common_name))
+        return record
 
     def get_files(self, common_name):
         """Return a bundle of TLS files associated with a common name"""
@@ -294,15 +443,11 @@ class CertStore():
         certs that were created externally (for example, let's encrypt)
         """
 
-        if not overwrite:
-            try:
-                self.get_record(common_name)
-                raise CertExistsError(
-                    "Certificate {name} already exists!"
-                    " Set overwrite=True to force add."
-                    .format(name=common_name))
-            except CertNotFoundError:
-                pass
+        if common_name in self.store and not overwrite:
+            raise CertExistsError(
+                "Certificate {name} already exists!"
+                " Set overwrite=True to force add."
+                .format(name=common_name))
 
         record = record or {
             'serial': serial,
@@ -332,17 +477,13 @@ class CertStore():
             record = self.get_record(common_name)
             serial = int(record['serial'])
             record['serial'] = serial + 1
-            TLSFileBundle(common_name).from_record(record).save_x509s(x509s)
+            TLSFileBundle(common_name).from_record(record).save_x509s(
+                x509s, prepared_dirs=self._prepared_dirs)
         else:
-            file_base_tmpl = "{prefix}/{cn}/{cn}"
-            file_base = file_base_tmpl.format(
-                prefix=self.containing_dir, cn=common_name
-            )
-            try:
-                ca_record = self.get_record(parent_ca)
-                ca_file = ca_record['files']['cert']
-            except CertNotFoundError:
-                ca_file = ''
+            file_base = os.path.join(
+                self.containing_dir, common_name, common_name)
+            ca_record = self.store.get(parent_ca)
+            ca_file = ca_record['files']['cert'] if ca_record else ''
             files = files or {
                 'key': file_base + '.key',
                 'cert': file_base + '.crt',
@@ -350,7 +491,8 @@ class CertStore():
             }
             bundle = TLSFileBundle(
                 common_name, files=files, x509s=x509s, is_ca=is_ca,
-                serial=serial, parent_ca=parent_ca, signees=signees)
+                serial=serial, parent_ca=parent_ca, signees=signees,
+                prepared_dirs=self._prepared_dirs)
             self.store[common_name] = bundle.to_record()
         self.save()
 
@@ -365,7 +507,7 @@ class CertStore():
             signees[signee_name] = 1
             ca_record['signees'] = signees
             signee_record['parent_ca'] = ca_name
-        self.save()
+            self.save()
 
     def remove_sign_link(self, ca_name, signee_name):
         """Removes signee_name to the signee list for ca_name"""
@@ -378,7 +520,7 @@ class CertStore():
             signees[signee_name] = 0
             ca_record['signees'] = signees
             signee_record['parent_ca'] = ''
-        self.save()
+            self.save()
 
     def update_record(self, common_name, **fields):
         """Update fields in an existing record"""
@@ -400,15 +542,12 @@ class CertStore():
                 "Authority {name} has signed {x} certificates"
                 .format(name=common_name, x=num_signees)
             )
-        try:
+        with self.batch():
             ca_name = bundle.record['parent_ca']
-            ca_record = self.get_record(ca_name)
-            self.remove_sign_link(ca_name, common_name)
-        except CertNotFoundError:
-            pass
-        record_copy = dict(self.store[common_name])
-        del self.store[common_name]
-        self.save()
+            if ca_name in self.store:
+                self.remove_sign_link(ca_name, common_name)
+            record_copy = dict(self.store.pop(common_name))
+            self.save()
         return record_copy
 
     def remove_files(self, common_name, delete_dir=False):
@@ -425,6 +564,7 @@ class CertStore():
                     delete_dirs.append(cert_containing_dir)
                 for d in delete_dirs:
                     shutil.rmtree(d)
+                    self._prepared_dirs.discard(d)
         return record
 
 
@@ -433,6 +573,46 @@ class Certipy():
                  remove_existing=False):
         self.store = CertStore(containing_dir=store_dir, store_file=store_file,
                                remove_existing=remove_existing)
+        self._ca_cache = OrderedDict()
+
+    def load_key_cert_pair(self, name, bundle=None):
+        """
+        Load the key and cert for name, reusing a previously read pair
+
+        Pairs are cached as DER until either file changes on disk or Certipy
+        overwrites them, so each caller gets its own x509 objects without
+        reading and decoding the PEM files again. Only the most recent
+        CA_CACHE_SIZE pairs are kept.
+
+        Arguments: name   - The name of the key-cert pair
+                   bundle - The TLSFileBundle for name, if already known
+        Returns:   Tuple of the key and cert x509 objects
+        """
+
+        bundle = bundle or self.store.get_files(name)
+        key_stat = os.stat(bundle.key.file_path)
+        cert_stat = os.stat(bundle.cert.file_path)
+        # Every overwrite through the store bumps the serial, which catches
+        # rewrites too quick for the file timestamps to show
+        stamp = (bundle.record['serial'],
+                 bundle.key.file_path, key_stat.st_mtime_ns,
+                 bundle.cert.file_path, cert_stat.st_mtime_ns)
+
+        cached = self._ca_cache.get(name)
+        if cached and cached[0] == stamp:
+            key_der, cert_der = cached[1]
+            return (crypto.load_privatekey(crypto.FILETYPE_ASN1, key_der),
+                    crypto.load_certificate(crypto.FILETYPE_ASN1, cert_der))
+
+        key = bundle.key.load()
+        cert = bundle.cert.load()
+        ders = (crypto.dump_privatekey(crypto.FILETYPE_ASN1, key),
+                crypto.dump_certificate(crypto.FILETYPE_ASN1, cert))
+        self._ca_cache.pop(name, None)
+        self._ca_cache[name] = (stamp, ders)
+        if len(self._ca_cache) > CA_CACHE_SIZE:
+            self._ca_cache.popitem(last=False)
+        return key, cert
 
     def create_key_pair(self, cert_type, bits):
         """
@@ -443,9 +623,56 @@ class Certipy():
         Returns:   The public/private key pair in a PKey object
         """
 
-        pkey = crypto.PKey()
-        pkey.generate_key(cert_type, bits)
-        return pkey
+        return _generate_key(cert_type, bits)
+
+    def create_key_pairs(self, cert_type, bits, count, workers=None,
+                         openssl=False):
+        """
+        Create a number of public/private key pairs in parallel
+
+        Keys are generated in a process pool. Where worker processes are
+        started with "spawn" (macOS and Windows), scripts calling this must
+        guard their entry point with `if __name__ == '__main__':`.
+
+        Arguments: cert_type - Key type, must be one of TYPE_RSA and TYPE_DSA
+                   bits      - Number of bits to use in each key
+                   count     - Number of key pairs to create
+                   workers   - Number of processes to use. By default, one
+                               per CPU when there are at least two keys per
+                               CPU to create, otherwise keys are created in
+                               this process
+                   openssl   - Generate RSA keys with `openssl genrsa`
+                               processes when the openssl binary is on PATH
+        Returns:   A list of PKey objects
+        """
+
+        cpus = os.cpu_count() or 1
+        openssl_path = openssl and cert_type == crypto.TYPE_RSA and \
+            shutil.which('openssl')
+        if workers is None and not openssl_path and count < cpus * 2:
+            # Not worth starting a pool for
+            workers = 1
+        workers = min(workers or cpus, count)
+        if openssl_path:
+            # Each key comes from its own openssl process, so threads are
+            # enough to keep them all running
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                keys = executor.map(
+                    _genrsa_openssl, repeat(openssl_path, count),
+                    repeat(bits, count))
+                return [crypto.load_privatekey(crypto.FILETYPE_PEM, key)
+                        for key in keys]
+
+        if workers < 2:
+            return [self.create_key_pair(cert_type, bits)
+                    for _ in range(count)]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            keys = executor.map(
+                _generate_key_der, repeat(cert_type, count),
+                repeat(bits, count), chunksize=max(1, count // (workers * 4)))
+            return [crypto.load_privatekey(crypto.FILETYPE_ASN1, key)
+                    for key in keys]
 
     def create_request(self, pkey, digest="sha256", **name):
         """
@@ -476,8 +703,14 @@ class Certipy():
         req = crypto.X509Req()
         subj = req.get_subject()
 
-        if name is not None:
-            for key, value in name.items():
+        # Known fields go in canonical DN order no matter how they were
+        # passed, followed by any others in the order given
+        for key in _NAME_ORDER:
+            value = name.get(key)
+            if value is not None:
+                setattr(subj, key, value)
+        for key, value in name.items():
+            if key not in _NAME_ORDER:
                 setattr(subj, key, value)
 
         req.set_pubkey(pkey)
@@ -512,10 +745,17 @@ class Certipy():
         cert.set_pubkey(req.get_pubkey())
 
         if extensions:
+            pending = []
             for ext in extensions:
                 if callable(ext):
+                    # Extensions built from the cert may rely on those before
+                    # them (authorityKeyIdentifier reads subjectKeyIdentifier)
+                    if pending:
+                        cert.add_extensions(pending)
+                        pending = []
                     ext = ext(cert)
-                cert.add_extensions([ext])
+                pending.append(ext)
+            cert.add_extensions(pending)
 
         cert.sign(issuer_key, digest)
 
@@ -525,10 +765,10 @@ class Certipy():
         """Create a CA bundle to trust only certs defined in names
         """
 
-        records = [rec for name, rec
-                   in self.store.store.items() if name in names]
+        names = set(names)
         return self.create_bundle(
-            bundle_name, names=[r['parent_ca'] for r in records])
+            bundle_name, names=[rec['parent_ca'] for name, rec
+                                in self.store.store.items() if name in names])
 
     def create_ca_bundle(self, bundle_name, ca_names=None):
         """
@@ -553,19 +793,17 @@ class Certipy():
 
         if not names:
             if ca_only:
-                names = []
-                for name, record in self.store.store.items():
-                    if record['is_ca']:
-                        names.append(name)
+                names = [name for name, record in self.store.store.items()
+                         if record['is_ca']]
             else:
                 names = self.store.store.keys()
 
         out_file_path = os.path.join(self.store.containing_dir, bundle_name)
-        with open(out_file_path, 'w') as fh:
+        with open(out_file_path, 'wb') as fh:
             for name in names:
                 bundle = self.store.get_files(name)
                 bundle.cert.load()
-                fh.write(str(bundle.cert))
+                fh.write(bytes(bundle.cert))
         return out_file_path
 
     def trust_from_graph(self, graph):
@@ -588,11 +826,10 @@ class Certipy():
 
         # Default to creating a CA (incapable of signing intermediaries) to
         # identify a component not known to Certipy
-        for component in distinct_components(graph):
-            try:
-                self.store.get_record(component)
-            except CertNotFoundError:
-                self.create_ca(component)
+        with self.store.batch():
+            for component in distinct_components(graph):
+                if component not in self.store.store:
+                    self.create_ca(component)
 
         # Build bundles from the graph
         trust_files = {}
@@ -625,24 +862,14 @@ class Certipy():
         parent_ca = ''
         if ca_name:
             ca_bundle = self.store.get_files(ca_name)
-            signing_key = ca_bundle.key.load()
-            signing_cert = ca_bundle.cert.load()
+            signing_key, signing_cert = self.load_key_cert_pair(
+                ca_name, bundle=ca_bundle)
             parent_ca = ca_bundle.cert.file_path
 
-        basicConstraints = "CA:true"
-        # If pathlen is exactly 0, this CA cannot sign intermediaries.
-        # A negative value leaves this out entirely and allows arbitrary
-        # numbers of intermediates.
-        if pathlen >=0:
-            basicConstraints += ', pathlen:' + str(pathlen)
-
         extensions = [
-            crypto.X509Extension(
-                b"basicConstraints", True, basicConstraints.encode()),
-            crypto.X509Extension(
-                b"keyUsage", True, b"keyCertSign, cRLSign"),
-            crypto.X509Extension(
-                b"extendedKeyUsage", True, b"serverAuth, clientAuth"),
+            _ca_basic_constraints(pathlen),
+            _EXT_CA_KEY_USAGE,
+            _EXT_SERVER_CLIENT_AUTH,
             lambda cert: crypto.X509Extension(
                 b"subjectKeyIdentifier", False, b"hash", subject=cert),
             lambda cert: crypto.X509Extension(
@@ -662,10 +889,11 @@ class Certipy():
             extensions=extensions)
 
         x509s = {'key': cakey, 'cert': cacert, 'ca': cacert}
-        self.store.add_files(name, x509s, overwrite=overwrite,
-                             parent_ca=parent_ca, is_ca=True)
-        if ca_name:
-            self.store.add_sign_link(ca_name, name)
+        with self.store.batch():
+            self.store.add_files(name, x509s, overwrite=overwrite,
+                                 parent_ca=parent_ca, is_ca=True)
+            if ca_name:
+                self.store.add_sign_link(ca_name, name)
         return self.store.get_record(name)
 
     def create_signed_pair(self, name, ca_name, cert_type=crypto.TYPE_RSA,
@@ -683,12 +911,70 @@ class Certipy():
         Returns:   KeyCertPair for the new signed pair
         """
 
+        cakey, cacert = self.load_key_cert_pair(ca_name)
         key = self.create_key_pair(cert_type, bits)
+        with self.store.batch():
+            return self._sign_key(name, key, ca_name, (cacert, cakey),
+                                  years=years, alt_names=alt_names,
+                                  overwrite=overwrite)
+
+    def create_signed_pairs(self, names, ca_name, cert_type=crypto.TYPE_RSA,
+                            bits=2048, years=5, alt_names_map=None,
+                            overwrite=False, workers=None, openssl=False):
+        """
+        Create a set of key-cert pairs signed by the same CA
+
+        The CA is loaded once, keys are generated in parallel and the store
+        is written once, after all of the pairs have been created.
+
+        Arguments: names     - The names of the key-cert pairs
+                   ca_name   - The name of the CA to sign these certs
+                   cert_type - The type of the certs. TYPE_RSA or TYPE_DSA
+                   bits     - The number of bits to use
+                   alt_names_map - A dict of name to an array of alternative
+                                   names in the format:
+                                   IP:address, DNS:address
+                   workers   - Number of processes used to generate keys,
+                               see create_key_pairs
+                   openssl   - Generate RSA keys with `openssl genrsa`
+        Returns:   Dict of name to record for the new signed pairs
+
+        Large batches generate keys in a process pool, so on macOS and
+        Windows scripts calling this need an `if __name__ == '__main__':`
+        guard.
+        """
+
+        names = list(names)
+        if not overwrite:
+            # Fail before generating any keys or writing any files
+            seen = set()
+            for name in names:
+                if name in self.store.store or name in seen:
+                    raise CertExistsError(
+                        "Certificate {name} already exists!"
+                        " Set overwrite=True to force add."
+                        .format(name=name))
+                seen.add(name)
+
+        alt_names_map = alt_names_map or {}
+        cakey, cacert = self.load_key_cert_pair(ca_name)
+        keys = self.create_key_pairs(cert_type, bits, len(names),
+                                     workers=workers, openssl=openssl)
+
+        records = {}
+        with self.store.batch():
+            for name, key in zip(names, keys):
+                records[name] = self._sign_key(
+                    name, key, ca_name, (cacert, cakey), years=years,
+                    alt_names=alt_names_map.get(name), overwrite=overwrite)
+        return records
+
+    def _sign_key(self, name, key, ca_name, ca_cert_key, years=5,
+                  alt_names=None, overwrite=False):
+        """Sign key with the CA, then store the pair and its signing link"""
+
         req = self.create_request(key, CN=name)
-        extensions = [
-            crypto.X509Extension(
-                b"extendedKeyUsage", True, b"serverAuth, clientAuth"),
-        ]
+        extensions = [_EXT_SERVER_CLIENT_AUTH]
 
         if alt_names:
             extensions.append(
@@ -696,11 +982,7 @@ class Certipy():
                                      False, ",".join(alt_names).encode())
             )
 
-        ca_bundle = self.store.get_files(ca_name)
-        cacert = ca_bundle.cert.load()
-        cakey = ca_bundle.key.load()
-
-        cert = self.sign(req, (cacert, cakey), (0, 60*60*24*365*years),
+        cert = self.sign(req, ca_cert_key, (0, 60*60*24*365*years),
                          extensions=extensions)
 
         x509s = {'key': key, 'cert': cert, 'ca': None}
@@ -18,9 +18,10 @@ from OpenSSL import crypto
 from pathlib import Path
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
+from .. import certipy as certipy_module
 from ..certipy import (
    TLSFileType, TLSFile, TLSFileBundle, CertStore, open_tls_file,
-   CertExistsError, Certipy
+   CertExistsError, CertNotFoundError, Certipy
 )
 
 @fixture(scope='module')
@@ -89,6 +90,64 @@ def test_tls_context_manager():
 
         assert simple_perms(fh.name) == '0o600'
 
+    # new files are created with their final permissions
+    with TemporaryDirectory() as td:
+        key_path = os.path.join(td, 'new', 'foo.key')
+        with open_tls_file(key_path, 'wb') as tlsfh:
+            assert simple_perms(key_path) == '0o600'
+            assert simple_perms(os.path.dirname(key_path)) == '0o755'
+
+        # without a prepared set, directory permissions are always fixed
+        os.chmod(os.path.dirname(key_path), 0o700)
+        with open_tls_file(key_path, 'wb') as tlsfh:
+            assert simple_perms(os.path.dirname(key_path)) == '0o755'
+
+        # prepared directories are skipped, but created again if removed
+        prepared_dirs = set()
+        with open_tls_file(key_path, 'wb', prepared_dirs=prepared_dirs):
+            pass
+        assert prepared_dirs == {os.path.dirname(key_path)}
+        shutil.rmtree(os.path.dirname(key_path))
+        with open_tls_file(key_path, 'wb', prepared_dirs=prepared_dirs):
+            assert simple_perms(key_path) == '0o600'
+
+
+def test_tls_context_manager_without_fchmod(monkeypatch):
+    def simple_perms(f):
+        return oct(os.stat(f).st_mode & 0o777)
+
+    with TemporaryDirectory() as td:
+        key_path = os.path.join(td, 'foo.key')
+        with open(key_path, 'w') as fh:
+            pass
+        os.chmod(key_path, 0o644)
+
+        # os.fchmod is missing on Windows before Python 3.13
+        monkeypatch.delattr(os, 'fchmod')
+        with open_tls_file(key_path, 'wb') as tlsfh:
+            tlsfh.write(b'key')
+        assert simple_perms(key_path) == '0o600'
+        with open(key_path, 'rb') as fh:
+            assert fh.read() == b'key'
+
+        # the descriptor is closed if it can't be wrapped
+        closed = []
+        real_close = os.close
+
+        def failing_fdopen(*args, **kwargs):
+            raise OSError("fdopen failed")
+
+        def recording_close(fd):
+            closed.append(fd)
+            real_close(fd)
+
+        monkeypatch.setattr(os, 'fdopen', failing_fdopen)
+        monkeypatch.setattr(os, 'close', recording_close)
+        with pytest.raises(OSError):
+            with open_tls_file(key_path, 'wb'):
+                pass
+        assert len(closed) == 1
+
 
 def test_tls_file(signed_key_pair):
     key, cert = signed_key_pair
@@ -104,6 +163,8 @@ def test_tls_file(signed_key_pair):
             loaded_tlsfile = TLSFile(fh.name, file_type=file_type)
             loaded_tlsfile.x509 = tlsfile.load()
             assert str(loaded_tlsfile) == str(tlsfile)
+            with open(fh.name, 'rb') as f:
+                assert f.read() == bytes(loaded_tlsfile)
 
     # public key
     read_write_key(TLSFileType.CERT)
@@ -149,6 +210,14 @@ def test_certipy_store(signed_key_pair, record):
 
         # save the store records to a file
         store.save()
+        assert not os.path.exists(store.store_file_path + '.tmp')
+
+        # a batch without changes doesn't write the store
+        os.remove(store.store_file_path)
+        with store.batch():
+            pass
+        assert not os.path.exists(store.store_file_path)
+        store.save()
 
         # read the records back in
         store.load()
@@ -160,7 +229,11 @@ def test_certipy_store(signed_key_pair, record):
 
         # add another record with no physical files
         signee_common_name = 'bar'
+        with pytest.raises(CertNotFoundError):
+            store.get_record(signee_common_name)
         store.add_record(signee_common_name, record=record)
+        with pytest.raises(CertExistsError):
+            store.add_record(signee_common_name, record=record)
 
         # 'sign' cert
         store.add_sign_link(common_name, signee_common_name)
@@ -185,6 +258,8 @@ def test_certipy():
         assert ca_bundle.cert.load() is not None
         assert 'PRIVATE' in str(ca_bundle.key)
         assert 'CERTIFICATE' in str(ca_bundle.cert)
+        assert 'pathlen' not in ca_bundle.cert.get_extension_value(
+            'basicConstraints')
 
         # create a cert and sign it with that CA
         cert_name = 'bar'
@@ -293,3 +368,170 @@ def test_certipy_trust_graph():
                 for untrusted_comp in not_trusts:
                     bundle = bundles[untrusted_comp]
                     assert str(bundle.cert) not in trust_bundle
+
+def test_certipy_ca_cache():
+    with TemporaryDirectory() as td:
+        ca_name = 'foo'
+        certipy = Certipy(store_dir=td)
+        certipy.create_ca(ca_name)
+
+        def der(pair):
+            key, cert = pair
+            return (crypto.dump_privatekey(crypto.FILETYPE_ASN1, key),
+                    crypto.dump_certificate(crypto.FILETYPE_ASN1, cert))
+
+        # repeated loads hand out copies of the same pair
+        key, cert = certipy.load_key_cert_pair(ca_name)
+        certipy.create_signed_pair('bar', ca_name)
+        cached_key, cached_cert = certipy.load_key_cert_pair(ca_name)
+        assert cached_key is not key and cached_cert is not cert
+        assert der((cached_key, cached_cert)) == der((key, cert))
+
+        # overwriting the CA invalidates the cached pair
+        certipy.create_ca(ca_name, overwrite=True)
+        new_key, new_cert = certipy.load_key_cert_pair(ca_name)
+        assert der((new_key, new_cert)) != der((key, cert))
+        assert str(certipy.store.get_files(ca_name).cert) == \
+            crypto.dump_certificate(
+                crypto.FILETYPE_PEM, new_cert).decode('utf-8')
+
+        # so does overwriting its files through the store, even when the
+        # rewrite is too quick to change the file timestamps
+        files = certipy.store.get_record(ca_name)['files']
+        paths = [files['key'], files['cert']]
+
+        def overwrite_keeping_mtimes(func, *args, **kwargs):
+            stats = [os.stat(path) for path in paths]
+            func(*args, **kwargs)
+            for path, stat in zip(paths, stats):
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        certipy.load_key_cert_pair(ca_name)
+        overwrite_keeping_mtimes(
+            certipy.store.add_files, ca_name, {'key': key, 'cert': cert},
+            overwrite=True)
+        assert der(certipy.load_key_cert_pair(ca_name)) == der((key, cert))
+
+        # or signing a new pair over it
+        certipy.create_ca('baz')
+        overwrite_keeping_mtimes(
+            certipy.create_signed_pair, ca_name, 'baz', overwrite=True)
+        assert der(certipy.load_key_cert_pair(ca_name)) != der((key, cert))
+
+def test_certipy_signed_pairs():
+    with TemporaryDirectory() as td:
+        ca_name = 'foo'
+        certipy = Certipy(store_dir=td)
+        certipy.create_ca(ca_name)
+
+        names = ['bar', 'baz', 'bat']
+        alt_names_map = {'baz': ['DNS:baz.example.com']}
+        with certipy.store.batch():
+            records = certipy.create_signed_pairs(
+                names, ca_name, alt_names_map=alt_names_map)
+            # the store file is only written once the outer batch completes
+            assert names[0] not in CertStore(containing_dir=td).store
+
+        assert list(records) == names
+        stored = CertStore(containing_dir=td)
+        for name in names:
+            assert stored.get_record(name)['parent_ca'] == ca_name
+            assert name in stored.get_record(ca_name)['signees']
+            bundle = certipy.store.get_files(name)
+            assert bundle.key.load() is not None
+            assert bundle.cert.load() is not None
+
+        stored_alt_names = certipy.store.get_files('baz').cert\
+            .get_extension_value('subjectAltName')
+        assert alt_names_map['baz'][0] in stored_alt_names
+        assert certipy.store.get_files('bar').cert\
+            .get_extension_value('subjectAltName') is None
+
+def test_certipy_key_pairs(monkeypatch):
+    with TemporaryDirectory() as td:
+        certipy = Certipy(store_dir=td)
+        for workers, openssl in ((1, False), (2, False), (2, True)):
+            keys = certipy.create_key_pairs(
+                crypto.TYPE_RSA, 1024, 3, workers=workers, openssl=openssl)
+            assert len(keys) == 3
+            assert all(key.bits() == 1024 and key.check() for key in keys)
+            assert len({crypto.dump_privatekey(crypto.FILETYPE_PEM, key)
+                        for key in keys}) == 3
+
+        key = certipy.create_key_pair(crypto.TYPE_DSA, 2048)
+        assert key.type() == crypto.TYPE_DSA and key.bits() == 2048
+        with pytest.raises(ValueError):
+            certipy.create_key_pair(-1, 2048)
+
+        # small batches don't start a process pool by default
+        def no_pool(*args, **kwargs):
+            raise AssertionError("process pool started")
+
+        monkeypatch.setattr(os, 'cpu_count', lambda: 4)
+        monkeypatch.setattr(certipy_module, 'ProcessPoolExecutor', no_pool)
+        assert len(certipy.create_key_pairs(crypto.TYPE_RSA, 1024, 7)) == 7
+
+        # sizes outside of what cryptography allows still work
+        key = certipy.create_key_pair(crypto.TYPE_DSA, 1536)
+        assert key.type() == crypto.TYPE_DSA and key.bits() == 1536
+        certipy.create_ca('dsa', cert_type=crypto.TYPE_DSA, bits=1536)
+        assert certipy.store.get_files('dsa').cert.load() is not None
+
+def test_certipy_request_subject():
+    with TemporaryDirectory() as td:
+        certipy = Certipy(store_dir=td)
+        key = certipy.create_key_pair(crypto.TYPE_RSA, 1024)
+        req = certipy.create_request(
+            key, CN='foo', O='Example', C='US', title='Widget')
+        components = req.get_subject().get_components()
+        assert [k for k, v in components] == [b'C', b'O', b'CN', b'title']
+
+def test_certipy_store_writes(monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def counting_fsync(fd):
+        fsyncs.append(fd)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', counting_fsync)
+
+    def writes(func, *args, **kwargs):
+        del fsyncs[:]
+        func(*args, **kwargs)
+        return len(fsyncs)
+
+    with TemporaryDirectory() as td:
+        certipy = Certipy(store_dir=td)
+        # each public call writes the store exactly once
+        assert writes(certipy.create_ca, 'foo') == 1
+        assert writes(certipy.create_ca, 'bar', ca_name='foo') == 1
+        assert writes(certipy.create_signed_pair, 'baz', 'foo') == 1
+        assert writes(certipy.create_signed_pairs,
+                      ['bat', 'qux'], 'foo', workers=1) == 1
+        assert writes(certipy.trust_from_graph,
+                      {'a': ['b'], 'b': ['c'], 'c': ['a']}) == 1
+        assert writes(certipy.store.remove_files, 'baz') == 1
+
+def test_certipy_signed_pairs_existing(monkeypatch):
+    with TemporaryDirectory() as td:
+        ca_name = 'foo'
+        certipy = Certipy(store_dir=td)
+        certipy.create_ca(ca_name)
+        certipy.create_signed_pair('bar', ca_name)
+
+        def no_keys(*args, **kwargs):
+            raise AssertionError("keys generated")
+
+        monkeypatch.setattr(certipy, 'create_key_pairs', no_keys)
+        with open(certipy.store.store_file_path, 'rb') as fh:
+            store_contents = fh.read()
+
+        # names already in the store or repeated fail before any work
+        for names in (['baz', 'bar'], ['baz', 'bat', 'baz']):
+            with pytest.raises(CertExistsError):
+                certipy.create_signed_pairs(names, ca_name)
+            assert 'baz' not in certipy.store.store
+            assert not os.path.exists(os.path.join(td, 'baz'))
+            with open(certipy.store.store_file_path, 'rb') as fh:
+                assert fh.read() == store_contents
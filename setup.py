@@ -65,11 +65,12 @@ setup(
 
     packages=find_packages(exclude=['contrib', 'docs', 'test']),
 
-    install_requires=['pyopenssl'],
+    install_requires=['cryptography', 'pyopenssl'],
 
     extras_require={
         'dev': ['pytest'],
         'test': ['pytest'],
+        'orjson': ['orjson'],
     },
 
     package_data={